@@ -1,47 +1,188 @@
-import hashlib
+import asyncio
 import logging
 import os
+import re
 import time
-from functools import lru_cache
 
-from cachetools import TTLCache
-from sentence_transformers import SentenceTransformer
-from sqlalchemy.sql import text
+import numpy as np
+import simsimd
+import xxhash
+from cachetools import LRUCache, TTLCache
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy.sql import bindparam, text
 
-from app.db import get_db
-from app.gemini import ask_gemini, ask_gemini_async
+from app.cache import cache_get, cache_get_async, cache_set, cache_set_async
+from app.db import (
+    EMBEDDING_BLOB_DTYPE, EMBEDDING_DIM, EMBEDDING_DTYPE, get_ro_conn, get_ro_conn_async, is_sqlite, quantize_embedding
+)
+from app.embeddings import EMBEDDING_MODEL_ID, model
+from app.gemini import GeminiError, ask_gemini, ask_gemini_async, ask_gemini_stream
+from app.semantic_cache import SemanticCache
 
 # Get configuration from environment variables
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
 CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # Cache TTL in seconds
 CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "100"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1000"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
 
 logger = logging.getLogger(__name__)
 
-# Initialize the embedding model
-model = SentenceTransformer(EMBEDDING_MODEL)
-
 # Create a TTL cache for question responses
 response_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
 
-# Create a cache for embeddings
-@lru_cache(maxsize=100)
-def get_question_embedding(question_hash):
-    """Generate and cache embedding for a question."""
-    return _generate_embedding(question_hash)
+# Bounded LRU cache of question embeddings, keyed by normalized question text
+embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+
+# Fuzzy answer cache so paraphrased questions reuse a previous Gemini response
+semantic_cache = SemanticCache(
+    maxsize=CACHE_SIZE, dim=EMBEDDING_DIM, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=CACHE_TTL
+)
+
+# Questions whose answer depends on the current date/time are never served from cache
+TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(?:today|tonight|tomorrow|yesterday|now|this (?:week|month|year))\b", re.IGNORECASE
+)
+
+# Version of the loaded context; part of every answer cache key.
+# None until a context has been loaded, and answers are not cached before then.
+_context_version = None
+
+# Candidate list size for the HNSW graph walk, scoped to the current transaction
+_EF_SEARCH_SQL = text(f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH}")
+
+# Embeddings are unit-normalized, so ranking by negative inner product (<#>)
+# matches L2 ranking with a cheaper per-row distance
+_CTX_SQL = text("""
+                SELECT content
+                FROM context_chunks
+                ORDER BY embedding <#> CAST(:embedding AS halfvec)
+                LIMIT :top_k
+                """).bindparams(bindparam("embedding", type_=HALFVEC(EMBEDDING_DIM)))
+
+def _qhash(question):
+    """Fast non-cryptographic cache key for a question."""
+    # xxhash 4.x only hashes bytes
+    return xxhash.xxh3_64_hexdigest(question.encode())
 
-def _generate_embedding(question_hash):
-    """Internal function to generate embedding from cache key."""
-    # Extract the original question from the hash (in a real implementation, 
-    # you might need a different approach to recover the question)
-    # For this example, we'll use a global dict to store question -> hash mapping
-    if question_hash in question_to_embedding:
-        return question_to_embedding[question_hash]
-    return None
+def set_context_version(version):
+    """
+    Namespace cached answers by the loaded context version (the document hash), so
+    answers computed against an older resume are never served after it changes.
+    """
+    global _context_version
+    if version != _context_version:
+        _context_version = version
+        response_cache.clear()
+        semantic_cache.clear()
+
+def _answer_key(question):
+    """Cache key for an answer: context version plus the normalized question hash."""
+    return f"v{_context_version}:{_qhash(question.strip().lower())}"
+
+def _is_cacheable(question):
+    """Answers are only reused once a context version is set, and never for time-sensitive questions."""
+    return _context_version is not None and TIME_SENSITIVE_PATTERN.search(question) is None
 
-# Dictionary to store question -> embedding mapping
-question_to_embedding = {}
+def _get_cached_response(question):
+    """Look up an answer in the local cache, then in the shared Redis cache."""
+    if not _is_cacheable(question):
+        return None
+    key = _answer_key(question)
+    response = response_cache.get(key)
+    if response is None:
+        cached = cache_get(f"ans:{key}")
+        if cached is not None:
+            response = response_cache[key] = cached.decode()
+    return response
+
+async def _get_cached_response_async(question):
+    """Asynchronous version of _get_cached_response."""
+    if not _is_cacheable(question):
+        return None
+    key = _answer_key(question)
+    response = response_cache.get(key)
+    if response is None:
+        cached = await cache_get_async(f"ans:{key}")
+        if cached is not None:
+            response = response_cache[key] = cached.decode()
+    return response
+
+def _get_similar_response(question, q_embedding):
+    """Look up the answer to a semantically similar cached question."""
+    if not _is_cacheable(question):
+        return None
+    return semantic_cache.get(q_embedding)
+
+def _cache_response(question, response, q_embedding=None):
+    """Store an answer in the local and shared caches, and in the semantic cache if embedded."""
+    if not _is_cacheable(question):
+        return
+    key = _answer_key(question)
+    response_cache[key] = response
+    cache_set(f"ans:{key}", response.encode())
+    if q_embedding is not None:
+        semantic_cache.set(q_embedding, response)
+
+async def _cache_response_async(question, response, q_embedding=None):
+    """Asynchronous version of _cache_response."""
+    if not _is_cacheable(question):
+        return
+    key = _answer_key(question)
+    response_cache[key] = response
+    await cache_set_async(f"ans:{key}", response.encode())
+    if q_embedding is not None:
+        semantic_cache.set(q_embedding, response)
+
+def get_question_embedding(question):
+    """Return the embedding for a question, using the local and shared caches when possible."""
+    start_time = time.time()
+    cache_key = question.strip().lower()
+    q_embedding = embedding_cache.get(cache_key)
+    if q_embedding is None:
+        # Namespaced by model so a model/backend switch never reuses old vectors
+        redis_key = f"emb:{_qhash(EMBEDDING_MODEL_ID)}:{_qhash(cache_key)}"
+        cached = cache_get(redis_key)
+        if cached is not None:
+            logger.debug("Using shared cached embedding for question")
+            q_embedding = np.frombuffer(cached, dtype=np.float32)
+        else:
+            logger.debug("Generating new embedding for question")
+            q_embedding = model.encode(
+                question, convert_to_numpy=True, normalize_embeddings=True
+            ).astype(np.float32)
+            cache_set(redis_key, q_embedding.tobytes())
+        embedding_cache[cache_key] = q_embedding
+    else:
+        logger.debug("Using cached embedding for question")
+    logger.debug(f"Embedding processing took {time.time() - start_time:.3f} seconds")
+    return q_embedding
+
+def _search_sqlite(conn, q_embedding, top_k):
+    """
+    Exact top-k search for the SQLite fallback, where embeddings are stored as
+    EMBEDDING_DTYPE blobs. Distances are computed with SimSIMD's runtime-dispatched
+    SIMD kernels directly on the stored precision, so fp16/int8 halve/quarter the bytes read.
+    """
+    rows = conn.execute(text("SELECT content, embedding FROM context_chunks")).fetchall()
+    if not rows:
+        return []
+
+    blob = b"".join(row[1] for row in rows)
+    if len(blob) != len(rows) * EMBEDDING_DIM * np.dtype(EMBEDDING_BLOB_DTYPE).itemsize:
+        logger.error(
+            f"Stored embeddings do not match EMBEDDING_DTYPE={EMBEDDING_DTYPE}; reload the context to rebuild them"
+        )
+        return []
+    matrix = np.frombuffer(blob, dtype=EMBEDDING_BLOB_DTYPE).reshape(len(rows), EMBEDDING_DIM)
+    query = quantize_embedding(q_embedding)
+    dists = np.asarray(simsimd.cdist(query[None, :], matrix, metric="sqeuclidean"))[0]
+
+    k = min(top_k, len(rows))
+    nearest = np.argpartition(dists, k - 1)[:k]
+    nearest = nearest[np.argsort(dists[nearest])]
+    return [(rows[i][0],) for i in nearest]
 
 def get_relevant_context(question, top_k=TOP_K_RESULTS):
     """
@@ -62,32 +203,17 @@ def get_relevant_context(question, top_k=TOP_K_RESULTS):
     logger.info(f"Getting relevant context for question: '{question[:50]}...' (top_k={top_k})")
 
     try:
-        # Create a hash of the question for caching
-        question_hash = hashlib.md5(question.encode()).hexdigest()
-
-        # Generate or retrieve cached embedding
-        embedding_start = time.time()
-        if question_hash not in question_to_embedding:
-            logger.debug(f"Generating new embedding for question (hash: {question_hash[:8]})")
-            q_embedding = model.encode([question])[0].tolist()
-            question_to_embedding[question_hash] = q_embedding
-        else:
-            logger.debug(f"Using cached embedding for question (hash: {question_hash[:8]})")
-            q_embedding = question_to_embedding[question_hash]
-        logger.debug(f"Embedding processing took {time.time() - embedding_start:.3f} seconds")
+        q_embedding = get_question_embedding(question)
 
-        with get_db() as db:
+        with get_ro_conn() as conn:
             try:
-                # Use the pgvector extension for efficient vector similarity search
                 db_start = time.time()
-                sql = text("""
-                           SELECT content
-                           FROM context_chunks
-                           ORDER BY embedding <-> CAST(:embedding AS vector)
-                           LIMIT :top_k
-                           """)
-
-                results = db.execute(sql, {"embedding": q_embedding, "top_k": top_k}).fetchall()
+                if is_sqlite:
+                    results = _search_sqlite(conn, q_embedding, top_k)
+                else:
+                    # Use the pgvector extension for efficient vector similarity search
+                    conn.execute(_EF_SEARCH_SQL)
+                    results = conn.execute(_CTX_SQL, {"embedding": q_embedding, "top_k": top_k}).fetchall()
 
                 if not results:
                     logger.warning("No context chunks found in database. Check if context was loaded properly.")
@@ -110,22 +236,102 @@ def get_relevant_context(question, top_k=TOP_K_RESULTS):
         logger.error(f"Unexpected error in get_relevant_context: {str(e)}", exc_info=True)
         return ""
 
-async def handle_question_async(question):
-    """Asynchronous version of handle_question."""
+async def get_relevant_context_async(question, top_k=TOP_K_RESULTS):
+    """
+    Asynchronous version of get_relevant_context.
+    Queries pgvector through asyncpg so the event loop is free while the database works.
+    """
+    if is_sqlite:
+        return await asyncio.to_thread(get_relevant_context, question, top_k)
+
+    start_time = time.time()
+    logger.info(f"Getting relevant context for question: '{question[:50]}...' (top_k={top_k})")
+
+    try:
+        # Encoding and the Redis lookup block, so keep them off the event loop
+        q_embedding = await asyncio.to_thread(get_question_embedding, question)
+
+        async with get_ro_conn_async() as conn:
+            db_start = time.time()
+            await conn.execute(_EF_SEARCH_SQL)
+            results = (await conn.execute(_CTX_SQL, {"embedding": q_embedding, "top_k": top_k})).fetchall()
+
+        if not results:
+            logger.warning("No context chunks found in database. Check if context was loaded properly.")
+            return ""
+
+        context = "\n\n".join([row[0] for row in results])
+        logger.debug(f"Database query took {time.time() - db_start:.3f} seconds")
+        logger.info(f"Retrieved {len(results)} context chunks in {time.time() - start_time:.3f} seconds")
+        return context
+    except Exception as e:
+        logger.error(f"Error in get_relevant_context_async: {str(e)}", exc_info=True)
+        # Return empty context in case of error to allow graceful degradation
+        return ""
+
+async def handle_question_async(question, client):
+    """Asynchronous version of handle_question; client is the shared Gemini AsyncClient."""
     # Check cache first
-    question_hash = hashlib.md5(question.encode()).hexdigest()
-    if question_hash in response_cache:
+    response = await _get_cached_response_async(question)
+    if response is not None:
         logger.info("Cache hit for question")
-        return response_cache[question_hash]
+        return response
 
-    # Get context and ask Gemini in parallel
-    context = get_relevant_context(question)
-    response = await ask_gemini_async(question, context)
+    # Fall back to a semantically similar cached question
+    q_embedding = await asyncio.to_thread(get_question_embedding, question)
+    response = _get_similar_response(question, q_embedding)
+    if response is not None:
+        logger.info("Semantic cache hit for question")
+        await _cache_response_async(question, response)
+        return response
+
+    # Get context without blocking the event loop, then ask Gemini
+    context = await get_relevant_context_async(question)
+    try:
+        response = await ask_gemini_async(question, context, client)
+    except GeminiError as e:
+        # Failures are returned to the caller but never cached
+        return e.response
 
     # Cache the response
-    response_cache[question_hash] = response
+    await _cache_response_async(question, response, q_embedding)
     return response
 
+async def handle_question_stream(question, client):
+    """
+    Streaming version of handle_question_async.
+    Yields answer fragments as Gemini produces them and caches the full answer only
+    if the stream completed.
+    """
+    response = await _get_cached_response_async(question)
+    if response is not None:
+        logger.info("Cache hit for question")
+        yield response
+        return
+
+    q_embedding = await asyncio.to_thread(get_question_embedding, question)
+    response = _get_similar_response(question, q_embedding)
+    if response is not None:
+        logger.info("Semantic cache hit for question")
+        await _cache_response_async(question, response)
+        yield response
+        return
+
+    context = await get_relevant_context_async(question)
+    fragments = []
+    try:
+        async for fragment in ask_gemini_stream(question, context, client):
+            fragments.append(fragment)
+            yield fragment
+    except GeminiError as e:
+        # The answer is incomplete or empty, so tell the client and do not cache it
+        yield e.response
+        return
+
+    response = "".join(fragments)
+    if response:
+        await _cache_response_async(question, response, q_embedding)
+
 def handle_question(question):
     """
     Handle a question by retrieving relevant context and querying Gemini.
@@ -134,20 +340,31 @@ def handle_question(question):
     start_time = time.time()
 
     # Check cache first
-    question_hash = hashlib.md5(question.encode()).hexdigest()
-    if question_hash in response_cache:
+    response = _get_cached_response(question)
+    if response is not None:
         logger.info("Cache hit for question")
-        return response_cache[question_hash]
+        return response
 
     try:
+        # Fall back to a semantically similar cached question
+        q_embedding = get_question_embedding(question)
+        response = _get_similar_response(question, q_embedding)
+        if response is not None:
+            logger.info("Semantic cache hit for question")
+            _cache_response(question, response)
+            return response
+
         # Get relevant context
         context = get_relevant_context(question)
 
-        # Query Gemini
-        response = ask_gemini(question, context)
+        # Query Gemini; failures are returned to the caller but never cached
+        try:
+            response = ask_gemini(question, context)
+        except GeminiError as e:
+            return e.response
 
         # Cache the response
-        response_cache[question_hash] = response
+        _cache_response(question, response, q_embedding)
 
         logger.info(f"Question handled in {time.time() - start_time:.2f} seconds")
         return response
@@ -0,0 +1,52 @@
+import logging
+import os
+
+import redis
+import redis.asyncio as aioredis
+
+# Get configuration from environment variables
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # Cache TTL in seconds
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))  # connect/read timeout in seconds
+
+logger = logging.getLogger(__name__)
+
+# Shared cache so every worker process sees the same entries and they survive restarts.
+# Values are raw bytes; callers encode/decode. Redis errors degrade to cache misses,
+# and short timeouts keep an unreachable Redis from stalling requests.
+redis_client = redis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT
+)
+async_redis_client = aioredis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT
+)
+
+def cache_get(key):
+    """Return the cached bytes for key, or None on a miss or Redis error."""
+    try:
+        return redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Redis cache read failed: {str(e)}")
+        return None
+
+def cache_set(key, value, ttl=CACHE_TTL):
+    """Store bytes under key with a TTL; failures are logged and ignored."""
+    try:
+        redis_client.setex(key, ttl, value)
+    except redis.RedisError as e:
+        logger.warning(f"Redis cache write failed: {str(e)}")
+
+async def cache_get_async(key):
+    """Asynchronous version of cache_get."""
+    try:
+        return await async_redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Redis cache read failed: {str(e)}")
+        return None
+
+async def cache_set_async(key, value, ttl=CACHE_TTL):
+    """Asynchronous version of cache_set."""
+    try:
+        await async_redis_client.setex(key, ttl, value)
+    except redis.RedisError as e:
+        logger.warning(f"Redis cache write failed: {str(e)}")
@@ -14,6 +14,7 @@ load_dotenv()
 # API Settings
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:streamGenerateContent"
 GEMINI_TIMEOUT = int(os.getenv("GEMINI_TIMEOUT", "10"))  # Timeout in seconds
 GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
 
@@ -22,12 +23,23 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))  # executions before server-side prepare
+DB_INIT_ATTEMPTS = int(os.getenv("DB_INIT_ATTEMPTS", "5"))  # startup attempts while the database comes up
+
+# Vector Index Settings
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
 
 # Caching Settings
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))  # per worker process
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
 CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # Cache TTL in seconds
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))  # connect/read timeout in seconds
 EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1000"))
 RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "100"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))  # cosine similarity
 
 # Chunking Settings
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "300"))  # words
@@ -37,6 +49,11 @@ TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
 # Rate Limiting
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", "100"))
 RATE_LIMIT_PERIOD = int(os.getenv("RATE_LIMIT_PERIOD", "60"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+
+# Concurrency
+# Threads for sync endpoints; scales with cores but never below 64 since /ask mostly waits on I/O
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(max(64, 2 * (os.cpu_count() or 1)))))
 
 # Monitoring
 ENABLE_METRICS = os.getenv("ENABLE_METRICS", "true").lower() == "true"
@@ -44,6 +61,11 @@ METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
 
 # Embedding Model
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")  # "onnx" or "torch"
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(min(4, os.cpu_count() or 1))))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "fp16")  # SQLite blob precision: fp32, fp16 or int8
 
 # Application Settings
 RESUME_PATH = os.getenv("RESUME_PATH", "resume.pdf")
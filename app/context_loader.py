@@ -1,23 +1,31 @@
 import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer
-from app.db import get_db, ContextChunk
+import io
+import numpy as np
+from app.db import get_db, ContextChunk, Document, EMBEDDING_DTYPE, is_sqlite, quantize_embedding
+from app.embeddings import EMBEDDING_MODEL_ID, model
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql import text
 import os
+import re
 import logging
 import hashlib
-from cachetools import LRUCache, cached
+import xxhash
+from cachetools import LRUCache
 import time
-from sqlalchemy import func
 
 # Get configuration from environment variables
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "300"))  # words
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))  # words of overlap between chunks
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
 
 logger = logging.getLogger(__name__)
 
-# Initialize the embedding model
-model = SentenceTransformer(EMBEDDING_MODEL)
+WORD_PATTERN = re.compile(r"\S+")
+
+# Stored vectors are only reusable with the same model and storage dtype
+EMBEDDING_FORMAT = f"{EMBEDDING_MODEL_ID}:{EMBEDDING_DTYPE if is_sqlite else 'halfvec'}"
 
 # Create an LRU cache for embeddings
 embedding_cache = LRUCache(maxsize=CACHE_SIZE)
@@ -26,93 +34,189 @@ def extract_text_from_pdf(file_path):
     """Extract text from a PDF file with error handling."""
     try:
         start_time = time.time()
+        # Stream pages into one buffer instead of building a list of page strings
+        buf = io.StringIO()
         doc = fitz.open(file_path)
-        text = "\n".join([page.get_text() for page in doc])
+        try:
+            for page in doc:
+                buf.write(page.get_text("text"))
+                buf.write("\n")
+        finally:
+            doc.close()
+        text = buf.getvalue()
         logger.info(f"PDF extraction completed in {time.time() - start_time:.2f} seconds")
         return text
     except Exception as e:
         logger.error(f"Error extracting text from PDF {file_path}: {str(e)}")
         raise
 
-def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+def _chunk_spans(total_words, chunk_size, overlap):
+    """Return (start, end) word-index arrays of overlapping chunks covering total_words words."""
+    span_starts = np.arange(0, total_words, chunk_size - overlap)
+    # Ensure we don't go beyond the text length
+    span_ends = np.minimum(span_starts + chunk_size, total_words)
+    # Stop at the first chunk that reaches the end of the text
+    count = int(np.argmax(span_ends == total_words)) + 1
+    return span_starts[:count], span_ends[:count]
+
+def iter_chunks(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     """
-    Split text into overlapping chunks for better context preservation.
-    Using overlapping chunks improves context retrieval quality.
+    Yield overlapping chunks of text one at a time, so callers can embed and store
+    them in batches without holding every chunk in memory.
     """
-    words = text.split()
-    total_words = len(words)
+    # Record word boundaries in one pass and slice the original string,
+    # instead of materializing a word list and re-joining it for every chunk
+    offsets = np.fromiter(
+        (pos for match in WORD_PATTERN.finditer(text) for pos in match.span()),
+        dtype=np.int64,
+    )
+    starts = offsets[0::2]
+    ends = offsets[1::2]
+    total_words = len(starts)
 
     if total_words <= chunk_size:
-        return [text]  # Return the entire text as one chunk if it's small enough
-
-    chunks = []
-    for i in range(0, total_words, chunk_size - overlap):
-        # Ensure we don't go beyond the text length
-        end_idx = min(i + chunk_size, total_words)
-        # Create chunk from words[i:end_idx]
-        chunk = " ".join(words[i:end_idx])
-        chunks.append(chunk)
+        yield text  # Yield the entire text as one chunk if it's small enough
+        return
 
-        # Break if we've reached the end of the text
-        if end_idx == total_words:
-            break
+    span_starts, span_ends = _chunk_spans(total_words, chunk_size, overlap)
+    # Convert the character offsets once so slicing uses plain ints
+    for start, end in zip(starts[span_starts].tolist(), ends[span_ends - 1].tolist()):
+        yield text[start:end]
 
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping chunks for better context preservation.
+    Using overlapping chunks improves context retrieval quality.
+    """
+    chunks = list(iter_chunks(text, chunk_size, overlap))
     logger.info(f"Created {len(chunks)} chunks with {overlap} words overlap")
     return chunks
 
-@cached(cache=embedding_cache)
-def get_embedding(text_hash, text):
-    """Generate embedding for text with caching based on hash."""
+def get_embeddings(chunks):
+    """
+    Generate embeddings for a list of chunks, reusing cached ones by content hash.
+    All uncached chunks are encoded in a single batched model call.
+    """
     start_time = time.time()
-    embedding = model.encode([text])[0].tolist()
-    logger.debug(f"Embedding generated in {time.time() - start_time:.2f} seconds")
-    return embedding
+    hashes = [xxhash.xxh3_64_hexdigest(chunk.encode()) for chunk in chunks]
+    embeddings = [embedding_cache.get(h) for h in hashes]
+    to_encode = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+    if to_encode:
+        encoded = model.encode(
+            [chunks[i] for i in to_encode],
+            batch_size=EMBEDDING_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,  # unit vectors so inner product ranks like L2
+        ).astype(np.float32)
+        for i, embedding in zip(to_encode, encoded):
+            embeddings[i] = embedding_cache[hashes[i]] = embedding
+
+    logger.debug(
+        f"Generated {len(to_encode)} embeddings ({len(chunks) - len(to_encode)} cached) "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+    return embeddings
+
+def store_chunks(db, source_name, chunks):
+    """Embed a batch of chunks and insert them through the given session. Returns the number stored."""
+    embeddings = get_embeddings(chunks)
+    # Insert the whole batch as one multi-row statement instead of per-object adds
+    db.bulk_insert_mappings(ContextChunk, [
+        {
+            "source": source_name,
+            "content": content,
+            "embedding": quantize_embedding(embedding).tobytes() if is_sqlite else embedding,
+        }
+        for content, embedding in zip(chunks, embeddings)
+    ])
+    return len(chunks)
+
+def upsert_document(db, source_name, file_hash, chunk_count):
+    """Record the loaded file hash and embedding format for a source, replacing any existing row."""
+    stmt = (sqlite_insert if is_sqlite else pg_insert)(Document).values(
+        source=source_name, file_hash=file_hash, chunk_count=chunk_count, embedding_format=EMBEDDING_FORMAT
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Document.source],
+        set_={
+            "file_hash": stmt.excluded.file_hash,
+            "chunk_count": stmt.excluded.chunk_count,
+            "embedding_format": stmt.excluded.embedding_format,
+        },
+    ))
+
+def hash_file(file_path):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 def load_and_store_context(file_path):
     """
     Load a document, chunk it, generate embeddings, and store in database.
     Uses improved chunking with overlap and caching for better performance.
+    Returns the sha256 of the file, which identifies the loaded context version.
     """
     start_time = time.time()
     source_name = os.path.basename(file_path)
 
-    # Check if document already exists in database
-    with get_db() as db:
-        existing_count = db.query(func.count(ContextChunk.id)).filter(
-            ContextChunk.source == source_name
-        ).scalar()
-
-        if existing_count > 0:
-            logger.info(f"Document {source_name} already exists with {existing_count} chunks. Skipping.")
-            return
-
-    # Extract and chunk text
-    text = extract_text_from_pdf(file_path)
-    chunks = chunk_text(text)
-
-    # Process chunks in batches to avoid memory issues
-    batch_size = 50
-    total_chunks = len(chunks)
+    file_hash = hash_file(file_path)
 
-    for i in range(0, total_chunks, batch_size):
-        batch_chunks = chunks[i:i + batch_size]
-
-        with get_db() as db:
-            for content in batch_chunks:
-                # Create a hash of the content for caching
-                content_hash = hashlib.md5(content.encode()).hexdigest()
-
-                # Get embedding with caching
-                embedding = get_embedding(content_hash, content)
-
-                # Add to database
-                db.add(ContextChunk(
-                    source=source_name, 
-                    content=content, 
-                    embedding=embedding
-                ))
-
-        logger.info(f"Processed batch {i//batch_size + 1}/{(total_chunks-1)//batch_size + 1}")
+    # The whole load is one transaction: an interrupted load rolls back to the previous
+    # chunks and Document row, so they always describe the same file
+    with get_db() as db:
+        if not is_sqlite:
+            # Workers starting together wait here; the first loads, the rest then skip
+            db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:source))"), {"source": source_name})
+
+        # Skip if this exact file content is already stored in the current embedding format;
+        # otherwise replace any stale chunks
+        document = db.get(Document, source_name)
+        if document is not None and document.file_hash == file_hash:
+            if document.embedding_format == EMBEDDING_FORMAT:
+                logger.info(f"Document {source_name} is unchanged with {document.chunk_count} chunks. Skipping.")
+                return file_hash
+            logger.info(
+                f"Embedding format changed from {document.embedding_format} to {EMBEDDING_FORMAT}. Reloading."
+            )
+
+        db.query(Document).filter(Document.source == source_name).delete()
+        deleted = db.query(ContextChunk).filter(ContextChunk.source == source_name).delete()
+        if deleted:
+            logger.info(f"Removed {deleted} stale chunks for {source_name}")
+
+        # Chunk, embed and store in a single streaming pass, one batch at a time
+        text_content = extract_text_from_pdf(file_path)
+        seen = set()
+        batch = []
+        total_chunks = 0
+        batch_number = 0
+
+        for chunk in iter_chunks(text_content):
+            # Drop empty and byte-identical chunks (e.g. repeated headers/footers) before embedding
+            chunk_hash = xxhash.xxh3_64_hexdigest(chunk.encode())
+            if not chunk.strip() or chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+            batch.append(chunk)
+
+            if len(batch) == EMBEDDING_BATCH_SIZE:
+                batch_number += 1
+                total_chunks += store_chunks(db, source_name, batch)
+                logger.info(f"Processed batch {batch_number}")
+                batch = []
+
+        if batch:
+            batch_number += 1
+            total_chunks += store_chunks(db, source_name, batch)
+            logger.info(f"Processed batch {batch_number}")
+
+        upsert_document(db, source_name, file_hash, total_chunks)
 
     total_time = time.time() - start_time
     logger.info(f"Loaded {total_chunks} chunks from {file_path} in {total_time:.2f} seconds")
+    return file_hash
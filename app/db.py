@@ -1,13 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, Text, String, Index
+from sqlalchemy import create_engine, Column, Integer, Text, String, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
+import numpy as np
 import os
 from dotenv import load_dotenv
 import logging
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.sql import text
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -19,11 +22,20 @@ if not DATABASE_URL:
 DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+EMBEDDING_DIM = 384  # output size of all-MiniLM-L6-v2
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "fp16")  # SQLite blob precision: fp32, fp16 or int8
 is_sqlite = make_url(DATABASE_URL).get_backend_name() == "sqlite"
 
-# Configure engine with connection pooling
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+# Configure engine with connection pooling. Postgres goes through psycopg 3, which
+# server-side prepares statements after DB_PREPARE_THRESHOLD executions so the hot
+# context query is parsed and planned once per connection
 engine = create_engine(
-    DATABASE_URL,
+    DATABASE_URL if is_sqlite else make_url(DATABASE_URL).set(drivername="postgresql+psycopg"),
+    connect_args={} if is_sqlite else {"prepare_threshold": DB_PREPARE_THRESHOLD},
     poolclass=QueuePool,
     pool_size=DB_POOL_SIZE,
     max_overflow=DB_MAX_OVERFLOW,
@@ -32,12 +44,34 @@ engine = create_engine(
     echo=False,  # Set to True for SQL query logging
 )
 
-# Create scoped session factory
-SessionFactory = sessionmaker(bind=engine)
-SessionLocal = scoped_session(SessionFactory)
+# Async engine (asyncpg) for read queries issued from the event loop
+async_engine = None
+if not is_sqlite:
+    async_engine = create_async_engine(
+        make_url(DATABASE_URL).set(drivername="postgresql+asyncpg"),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+
+# Plain session factory; each get_db() scope creates and closes its own session
+SessionLocal = sessionmaker(bind=engine)
 
 Base = declarative_base()
 
+EMBEDDING_BLOB_DTYPE = {"fp32": np.float32, "fp16": np.float16, "int8": np.int8}[EMBEDDING_DTYPE]
+
+def quantize_embedding(embedding):
+    """
+    Convert a unit-normalized float32 embedding to the SQLite storage dtype.
+    Postgres always stores halfvec; this only applies to the SQLite blob column.
+    """
+    if EMBEDDING_BLOB_DTYPE is np.int8:
+        # Components of a unit vector lie in [-1, 1], so one fixed scale keeps ranking intact
+        return np.clip(np.rint(embedding * 127), -127, 127).astype(np.int8)
+    return embedding.astype(EMBEDDING_BLOB_DTYPE)
+
 # Model for context chunks
 class ContextChunk(Base):
     __tablename__ = "context_chunks"
@@ -45,13 +79,23 @@ class ContextChunk(Base):
     id = Column(Integer, primary_key=True, index=True)
     source = Column(String, nullable=False)  # e.g., "resume.pdf"
     content = Column(Text, nullable=False)
-    embedding = Column(Vector(384) if not is_sqlite else String)  # fallback for SQLite
+    # Stored as half precision: halves the bytes scanned per row with negligible recall loss
+    embedding = Column(HALFVEC(EMBEDDING_DIM) if not is_sqlite else LargeBinary)  # EMBEDDING_DTYPE blob on SQLite
 
     # Create an index on the source column for faster filtering
     __table_args__ = (
         Index('idx_source', 'source'),
     )
 
+# One row per loaded document, used to skip re-embedding unchanged files on startup
+class Document(Base):
+    __tablename__ = "documents"
+
+    source = Column(String, primary_key=True)  # e.g., "resume.pdf"
+    file_hash = Column(String(64), nullable=False)  # sha256 of the file contents
+    chunk_count = Column(Integer, nullable=False)
+    embedding_format = Column(String, nullable=False)  # model and storage dtype of the stored vectors
+
 @contextmanager
 def get_db():
     """Provide a transactional scope around a series of operations."""
@@ -66,11 +110,50 @@ def get_db():
     finally:
         db.close()
 
+@contextmanager
+def get_ro_conn():
+    """
+    Provide a bare pooled connection for read-only queries.
+    Skips the ORM session (unit of work, identity map, autoflush); the implicit
+    transaction is rolled back when the connection returns to the pool.
+    """
+    with engine.connect() as conn:
+        yield conn
+
+@asynccontextmanager
+async def get_ro_conn_async():
+    """Async counterpart of get_ro_conn backed by the asyncpg engine."""
+    async with async_engine.connect() as conn:
+        yield conn
+
 def init_db():
     """Initialize database tables and indexes."""
     try:
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created successfully")
+
+        if not is_sqlite:
+            with engine.begin() as conn:
+                # create_all leaves existing tables alone, so convert a context_chunks table
+                # created before the switch from vector to halfvec in place
+                column_type = conn.execute(text(
+                    "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                    "WHERE attrelid = 'context_chunks'::regclass AND attname = 'embedding'"
+                )).scalar()
+                if column_type != f"halfvec({EMBEDDING_DIM})":
+                    logger.info(f"Converting context_chunks.embedding from {column_type} to halfvec({EMBEDDING_DIM})")
+                    conn.execute(text(
+                        f"ALTER TABLE context_chunks ALTER COLUMN embedding "
+                        f"TYPE halfvec({EMBEDDING_DIM}) USING embedding::halfvec({EMBEDDING_DIM})"
+                    ))
+
+                # Approximate nearest-neighbour index so similarity search avoids a full table scan
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_ctx_embedding_hnsw_ip ON context_chunks "
+                    "USING hnsw (embedding halfvec_ip_ops) "
+                    f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+                ))
+            logger.info("HNSW index on context_chunks.embedding ensured")
     except Exception as e:
         logger.error(f"Error creating database tables: {str(e)}")
         raise
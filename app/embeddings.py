@@ -0,0 +1,52 @@
+import logging
+import os
+
+# Get configuration from environment variables
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")  # "onnx" or "torch"
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+# MiniLM's small matmuls stop scaling past a few threads; more just oversubscribes the CPU
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# Identifies which model produced a vector; different backends/exports give slightly different vectors
+EMBEDDING_MODEL_ID = (
+    f"{EMBEDDING_MODEL}:onnx:{EMBEDDING_ONNX_FILE}" if EMBEDDING_BACKEND == "onnx" else f"{EMBEDDING_MODEL}:torch"
+)
+
+# OpenMP/MKL read these when they initialize, so they must be set before torch is imported
+os.environ.setdefault("OMP_NUM_THREADS", str(EMBEDDING_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(EMBEDDING_THREADS))
+
+import onnxruntime  # noqa: E402
+import torch  # noqa: E402
+from sentence_transformers import SentenceTransformer  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+def load_model():
+    """
+    Load the sentence embedding model.
+    The ONNX backend runs the dynamically int8-quantized export under ONNX Runtime,
+    which is several times faster than fp32 PyTorch for MiniLM on CPU.
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        logger.info(f"Loading {EMBEDDING_MODEL} with ONNX Runtime ({EMBEDDING_ONNX_FILE})")
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = EMBEDDING_THREADS
+        session_options.inter_op_num_threads = 1
+        return SentenceTransformer(
+            EMBEDDING_MODEL,
+            backend="onnx",
+            model_kwargs={
+                "file_name": EMBEDDING_ONNX_FILE,
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            },
+        )
+    logger.info(f"Loading {EMBEDDING_MODEL} with PyTorch ({EMBEDDING_THREADS} threads)")
+    torch.set_num_threads(EMBEDDING_THREADS)
+    torch.set_num_interop_threads(1)
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+# Shared by question answering and context loading so the model is loaded once per process
+model = load_model()
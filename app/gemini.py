@@ -1,5 +1,7 @@
+import json
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import httpx
 import logging
 import time
@@ -9,6 +11,7 @@ import asyncio
 # Get configuration from environment variables
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:streamGenerateContent"
 GEMINI_TIMEOUT = int(os.getenv("GEMINI_TIMEOUT", "10"))  # Timeout in seconds
 MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
 
@@ -24,6 +27,25 @@ RETRY_EXCEPTIONS = (
     httpx.RequestError
 )
 
+# User-facing replies when Gemini gives no usable answer
+ERROR_RESPONSE = "I'm sorry, there was an error processing your request. Please try again later."
+UNPROCESSABLE_RESPONSE = "I'm sorry, I couldn't process your question properly. Please try again."
+UNEXPECTED_ERROR_RESPONSE = "I'm sorry, an unexpected error occurred. Please try again later."
+
+class GeminiError(Exception):
+    """
+    Raised when Gemini returns no usable answer, so callers can tell a failure from
+    an answer (and never cache it). ``response`` is the reply to show the user.
+    """
+
+    def __init__(self, response):
+        super().__init__(response)
+        self.response = response
+
+# Shared session for the sync path, so keep-alive connections are reused across calls
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=100))
+
 def create_prompt(question, context):
     """Create a well-structured prompt for the Gemini model."""
     return f"""Context information is below.
@@ -34,6 +56,22 @@ Given the context information and not prior knowledge, answer the question: {que
 If the answer cannot be found in the context, say "I don't have enough information to answer this question."
 """
 
+def build_request_body(prompt):
+    """Build the generateContent request body for a prompt."""
+    return {
+        "contents": [
+            {
+                "parts": [{"text": prompt}]
+            }
+        ],
+        "generationConfig": {
+            "temperature": 0.2,  # Lower temperature for more focused responses
+            "topP": 0.8,
+            "topK": 40,
+            "maxOutputTokens": 1024,
+        }
+    }
+
 @retry(
     stop=stop_after_attempt(MAX_RETRIES),
     wait=wait_exponential(multiplier=1, min=1, max=10),
@@ -43,27 +81,15 @@ If the answer cannot be found in the context, say "I don't have enough informati
 def ask_gemini(question, context):
     """
     Query the Gemini API with retry logic for resilience.
-    Uses exponential backoff for retries.
+    Uses exponential backoff for retries. Raises GeminiError when no answer is available.
     """
     start_time = time.time()
     prompt = create_prompt(question, context)
 
-    body = {
-        "contents": [
-            {
-                "parts": [{"text": prompt}]
-            }
-        ],
-        "generationConfig": {
-            "temperature": 0.2,  # Lower temperature for more focused responses
-            "topP": 0.8,
-            "topK": 40,
-            "maxOutputTokens": 1024,
-        }
-    }
+    body = build_request_body(prompt)
 
     try:
-        response = requests.post(
+        response = session.post(
             f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
             json=body,
             timeout=GEMINI_TIMEOUT
@@ -80,7 +106,7 @@ def ask_gemini(question, context):
             return result
         else:
             logger.warning("Unexpected response structure from Gemini API")
-            return "I'm sorry, I couldn't process your question properly. Please try again."
+            raise GeminiError(UNPROCESSABLE_RESPONSE)
 
     except requests.exceptions.HTTPError as e:
         logger.error(f"HTTP error from Gemini API: {str(e)}")
@@ -89,58 +115,111 @@ def ask_gemini(question, context):
             logger.warning("Rate limit hit, implementing backoff")
             time.sleep(2)  # Simple backoff
             raise e  # Will be caught by retry decorator
-        return "I'm sorry, there was an error processing your request. Please try again later."
+        raise GeminiError(ERROR_RESPONSE) from e
 
     except RETRY_EXCEPTIONS as e:
         logger.error(f"Network error with Gemini API: {str(e)}")
         raise  # Will be caught by retry decorator
 
+    except GeminiError:
+        raise
+
     except Exception as e:
         logger.error(f"Unexpected error with Gemini API: {str(e)}")
-        return "I'm sorry, an unexpected error occurred. Please try again later."
+        raise GeminiError(UNEXPECTED_ERROR_RESPONSE) from e
 
-async def ask_gemini_async(question, context):
+def create_async_client():
     """
-    Asynchronous version of ask_gemini using httpx.
+    Create the shared AsyncClient for Gemini calls.
+    One client per process keeps TLS connections alive across requests, and
+    HTTP/2 multiplexes concurrent requests over them.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=GEMINI_TIMEOUT,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+    )
+
+async def ask_gemini_async(question, context, client):
+    """
+    Asynchronous version of ask_gemini using the shared httpx client.
+    Raises GeminiError when no answer is available.
     """
     start_time = time.time()
     prompt = create_prompt(question, context)
 
-    body = {
-        "contents": [
-            {
-                "parts": [{"text": prompt}]
-            }
-        ],
-        "generationConfig": {
-            "temperature": 0.2,
-            "topP": 0.8,
-            "topK": 40,
-            "maxOutputTokens": 1024,
-        }
-    }
+    body = build_request_body(prompt)
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-                json=body,
-                timeout=GEMINI_TIMEOUT
-            )
+        response = await client.post(
+            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
+            json=body,
+            timeout=GEMINI_TIMEOUT
+        )
 
-            response.raise_for_status()
+        response.raise_for_status()
 
-            data = response.json()
-            candidates = data.get("candidates", [])
+        data = response.json()
+        candidates = data.get("candidates", [])
 
-            if candidates and "content" in candidates[0] and "parts" in candidates[0]["content"]:
-                result = candidates[0]["content"]["parts"][0]["text"]
-                logger.info(f"Async Gemini API call completed in {time.time() - start_time:.2f} seconds")
-                return result
-            else:
-                logger.warning("Unexpected response structure from Gemini API")
-                return "I'm sorry, I couldn't process your question properly. Please try again."
+        if candidates and "content" in candidates[0] and "parts" in candidates[0]["content"]:
+            result = candidates[0]["content"]["parts"][0]["text"]
+            logger.info(f"Async Gemini API call completed in {time.time() - start_time:.2f} seconds")
+            return result
+        else:
+            logger.warning("Unexpected response structure from Gemini API")
+            raise GeminiError(UNPROCESSABLE_RESPONSE)
 
     except (httpx.HTTPStatusError, httpx.RequestError) as e:
         logger.error(f"Error with async Gemini API call: {str(e)}")
-        return "I'm sorry, there was an error processing your request. Please try again later."
+        raise GeminiError(ERROR_RESPONSE) from e
+
+    except ValueError as e:
+        logger.error(f"Invalid JSON from async Gemini API call: {str(e)}")
+        raise GeminiError(UNEXPECTED_ERROR_RESPONSE) from e
+
+async def ask_gemini_stream(question, context, client):
+    """
+    Stream the Gemini answer as text fragments using streamGenerateContent (SSE).
+    Yields each fragment as soon as it arrives so callers can forward it immediately.
+    Raises GeminiError if the stream fails, including mid-stream, or carries no text,
+    so callers can tell a partial or empty answer from a complete one.
+    """
+    start_time = time.time()
+    prompt = create_prompt(question, context)
+    body = build_request_body(prompt)
+    received_text = False
+
+    try:
+        async with client.stream(
+            "POST",
+            f"{GEMINI_STREAM_URL}?alt=sse&key={GEMINI_API_KEY}",
+            json=body,
+            timeout=GEMINI_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                candidates = json.loads(line[len("data:"):]).get("candidates", [])
+                if candidates and "content" in candidates[0] and "parts" in candidates[0]["content"]:
+                    text = candidates[0]["content"]["parts"][0].get("text", "")
+                    if text:
+                        received_text = True
+                        yield text
+
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        logger.error(f"Error with streamed Gemini API call: {str(e)}")
+        raise GeminiError(ERROR_RESPONSE) from e
+
+    except ValueError as e:
+        logger.error(f"Invalid event in streamed Gemini API call: {str(e)}")
+        raise GeminiError(UNEXPECTED_ERROR_RESPONSE) from e
+
+    if not received_text:
+        # e.g. a safety block, or chunks without parts
+        logger.warning("Streamed Gemini API call returned no text")
+        raise GeminiError(UNPROCESSABLE_RESPONSE)
+
+    logger.info(f"Streamed Gemini API call completed in {time.time() - start_time:.2f} seconds")
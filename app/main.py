@@ -1,36 +1,172 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-from pydantic import BaseModel, Field, field_validator
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, StringConstraints
 from app.db import init_db
-from app.context_loader import load_and_store_context
-from app.ask import handle_question, handle_question_async
+from app.gemini import create_async_client
+from app.rate_limit import InProcessLimiter
 from app.config import (
-    RATE_LIMIT, RATE_LIMIT_PERIOD, REDIS_URL,
-    ENABLE_METRICS, METRICS_PORT, RESUME_PATH
+    RATE_LIMIT, RATE_LIMIT_PERIOD, RATE_LIMIT_BACKEND, REDIS_URL, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT,
+    ENABLE_METRICS, METRICS_PORT, RESUME_PATH, THREADPOOL_SIZE, DB_INIT_ATTEMPTS
 )
+import asyncio
+import importlib
+import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 import time
-import redis.asyncio as redis
-from prometheus_client import Counter, Histogram, start_http_server
-from typing import Optional
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("app.log")
-    ]
-)
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Annotated
+from anyio import to_thread
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+# Heavy modules (embedding model, question pipeline, Redis limiter) are imported
+# where they are first needed, so importing this module stays fast for worker boot
+
+# Configure logging: request paths only enqueue records, and a listener thread
+# started in the lifespan does the console/file writes
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [logging.StreamHandler(), logging.FileHandler("app.log")]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+queue_handler = QueueHandler(log_queue)
+# QueueHandler.prepare() bakes its formatter's output into record.msg; keep only the
+# message so the listener's handlers apply the full format once
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
 logger = logging.getLogger(__name__)
 
-# Lazy-init Prometheus metrics
-REQUEST_COUNT = None
-REQUEST_LATENCY = None
+class QuietAccessFilter(logging.Filter):
+    """Drop uvicorn access-log lines for probe and scrape requests."""
+
+    QUIET_PATHS = frozenset({"/health", "/metrics"})
+
+    def filter(self, record):
+        # uvicorn.access args: (client_addr, method, full_path, http_version, status_code)
+        args = record.args
+        if isinstance(args, tuple) and len(args) >= 3:
+            return str(args[2]).split("?", 1)[0] not in self.QUIET_PATHS
+        return True
+
+logging.getLogger("uvicorn.access").addFilter(QuietAccessFilter())
+
+async def init_rate_limiter(app):
+    """Initialize the Redis-based rate limiter when it is the configured backend."""
+    if RATE_LIMIT_BACKEND == "redis":
+        import redis.asyncio as redis
+        from fastapi_limiter import FastAPILimiter
+        # Dedicated pool; replies stay bytes since the limiter only reads integer counters.
+        # Blocking, so a burst past the cap waits for a free connection instead of raising
+        pool = redis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            health_check_interval=30,
+            socket_keepalive=True,
+            client_name="ratelimiter",
+            decode_responses=False,
+        )
+        app.state.limiter_redis = redis.Redis(connection_pool=pool)
+        await FastAPILimiter.init(app.state.limiter_redis)
+        logger.info("Rate limiter initialized successfully")
+
+@retry(
+    stop=stop_after_attempt(DB_INIT_ATTEMPTS),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    before_sleep=lambda state: logger.warning(f"Database not ready, retrying (attempt {state.attempt_number})"),
+    reraise=True,
+)
+def init_database():
+    """Create tables and indexes (blocking; run in a worker thread), retrying while the database starts."""
+    logger.info("Initializing database...")
+    init_db()
+    logger.info("Database initialized successfully.")
+
+def load_models():
+    """Import the embedding model and question pipeline (blocking; run in a worker thread)."""
+    importlib.import_module("app.context_loader")
+    importlib.import_module("app.ask")
+    logger.info("Embedding model and question pipeline loaded.")
+
+async def load_context(app):
+    """Load and embed the PDF context in the background, then mark the service ready or failed."""
+    try:
+        logger.info(f"Loading PDF context from {RESUME_PATH}...")
+        from app.ask import set_context_version
+        from app.context_loader import load_and_store_context
+        loop = asyncio.get_running_loop()
+        file_hash = await loop.run_in_executor(app.state.ingest_executor, load_and_store_context, RESUME_PATH)
+        # Cached answers are keyed by context version, so a changed resume invalidates them
+        set_context_version(file_hash[:16])
+        app.state.context_state = "ready"
+        logger.info("PDF context loaded successfully.")
+    except Exception as e:
+        app.state.context_state = "failed"
+        logger.error(f"Error loading PDF context: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app):
+    """Set up shared resources on app.state at startup and release them on shutdown."""
+    log_listener.start()
+    # "loading" until startup ends in "ready" or "failed"; see /health and require_context
+    app.state.context_state = "loading"
+    app.state.limiter_redis = None
+    # Shared Gemini HTTP client, reused across requests for keep-alive/HTTP/2
+    app.state.http_client = create_async_client()
+    # Chunking/embedding the PDF runs on its own thread so it never competes with
+    # request handlers for the anyio or default asyncio threadpools
+    app.state.ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+    try:
+        # Size the threadpool that runs sync endpoints such as /ask
+        to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+        # Independent steps run concurrently; blocking ones in worker threads
+        steps = {
+            "rate limiter": init_rate_limiter(app),
+            "database": asyncio.to_thread(init_database),
+            "models": asyncio.to_thread(load_models),
+        }
+        # One failed step must not leave the others unreported or the context unloaded
+        results = await asyncio.gather(*steps.values(), return_exceptions=True)
+        failed = set()
+        for name, result in zip(steps, results):
+            if isinstance(result, Exception):
+                failed.add(name)
+                logger.error(f"Error initializing {name}: {str(result)}")
+
+        if failed & {"database", "models"}:
+            # The context cannot be loaded; report failure instead of staying "initializing"
+            app.state.context_state = "failed"
+        else:
+            # Embedding the PDF does not block serving; /health reports "initializing" until done
+            app.state.context_task = asyncio.create_task(load_context(app))
+
+        # Start the Prometheus metrics server
+        if ENABLE_METRICS:
+            await asyncio.to_thread(start_http_server, METRICS_PORT)
+            logger.info(f"Metrics server started on port {METRICS_PORT}")
+
+    except Exception as e:
+        logger.error(f"Error initializing services: {str(e)}")
+        if getattr(app.state, "context_task", None) is None:
+            app.state.context_state = "failed"
+
+    yield
+
+    # Release sockets so recycled workers do not leak connections
+    context_task = getattr(app.state, "context_task", None)
+    if context_task is not None:
+        context_task.cancel()
+    await app.state.http_client.aclose()
+    if app.state.limiter_redis is not None:
+        await app.state.limiter_redis.aclose()
+    app.state.ingest_executor.shutdown(wait=False, cancel_futures=True)
+    # Flush queued records last so shutdown messages are written
+    log_listener.stop()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -39,6 +175,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS Middleware
@@ -50,106 +187,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Metrics Middleware
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
+# Rate limiting: in-process token buckets by default, Redis-backed for multi-worker deployments
+if RATE_LIMIT_BACKEND == "redis":
+    from fastapi_limiter.depends import RateLimiter
+    rate_limiter = RateLimiter(times=RATE_LIMIT, seconds=RATE_LIMIT_PERIOD)
+else:
+    rate_limiter = InProcessLimiter(times=RATE_LIMIT, seconds=RATE_LIMIT_PERIOD)
 
-    if ENABLE_METRICS and REQUEST_COUNT and REQUEST_LATENCY:
-        REQUEST_COUNT.labels(
-            'personal_bot_api',
-            request.url.path,
-            request.method,
-            response.status_code
-        ).inc()
+# Prometheus metrics and their middleware are only set up when enabled,
+# so the request path carries no metrics checks otherwise
+if ENABLE_METRICS:
+    from prometheus_client import Counter, Histogram, start_http_server
 
-        REQUEST_LATENCY.labels(
-            'personal_bot_api',
-            request.url.path
-        ).observe(time.time() - start_time)
+    REQUEST_COUNT = Counter(
+        'request_count', 'App Request Count',
+        ['app_name', 'endpoint', 'method', 'status_code']
+    )
+    REQUEST_LATENCY = Histogram(
+        'request_latency_seconds', 'Request latency in seconds',
+        ['app_name', 'endpoint']
+    )
 
-    return response
+    # Probe/scrape paths are not worth measuring
+    SKIP_METRICS_PATHS = frozenset({"/health", "/metrics"})
+
+    # Labelled metric children, cached per (endpoint, method, status) to skip the label lookup
+    _metric_children = {}
+
+    def get_metric_children(endpoint, method, status_code):
+        """Return the (counter, histogram) children for a label combination."""
+        key = (endpoint, method, status_code)
+        children = _metric_children.get(key)
+        if children is None:
+            children = _metric_children[key] = (
+                REQUEST_COUNT.labels('personal_bot_api', endpoint, method, status_code),
+                REQUEST_LATENCY.labels('personal_bot_api', endpoint),
+            )
+        return children
 
-# Pydantic model with updated validator
+    # Metrics Middleware
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        if request.url.path in SKIP_METRICS_PATHS:
+            return await call_next(request)
+
+        start_time = time.perf_counter()
+        response = await call_next(request)
+
+        # Label by route template so unmatched URLs cannot blow up label cardinality
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        count, latency = get_metric_children(endpoint, request.method, response.status_code)
+        count.inc()
+        latency.observe(time.perf_counter() - start_time)
+
+        return response
+
+# Pydantic model; stripping and length checks run in pydantic-core, without a Python validator
 class AskRequest(BaseModel):
-    question: str = Field(..., min_length=3, max_length=500)
+    question: Annotated[str, StringConstraints(strip_whitespace=True, min_length=3, max_length=500)]
 
-    @field_validator('question')
-    @classmethod
-    def question_must_be_valid(cls, v):
-        if not v.strip():
-            raise ValueError('Question cannot be empty or just whitespace')
-        return v.strip()
+# Typed responses are validated and serialized to JSON bytes by pydantic-core
+class AskResponse(BaseModel):
+    response: str
 
 class HealthResponse(BaseModel):
     status: str
     version: str
 
-# Application startup hook
-@app.on_event("startup")
-async def startup():
-    global REQUEST_COUNT, REQUEST_LATENCY
-    try:
-        # Initialize Redis-based rate limiter
-        redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
-        await FastAPILimiter.init(redis_client)
-        logger.info("Rate limiter initialized successfully")
+# Probe responses are serialized once; the handler only picks the right bytes.
+# Anything but "ready" is a 503, so orchestrators only route to workers that can answer.
+_HEALTH_RESPONSES = {
+    "ready": (200, json.dumps({"status": "healthy", "version": "1.0.0"}).encode()),
+    "loading": (503, json.dumps({"status": "initializing", "version": "1.0.0"}).encode()),
+    "failed": (503, json.dumps({"status": "unhealthy", "version": "1.0.0"}).encode()),
+}
 
-        # Initialize database and create tables
-        logger.info("Initializing database...")
-        init_db()
-        logger.info("Database initialized successfully.")
+@app.get("/health", responses={200: {"model": HealthResponse}, 503: {"model": HealthResponse}})
+async def health_check(request: Request):
+    status_code, body = _HEALTH_RESPONSES[request.app.state.context_state]
+    return Response(content=body, status_code=status_code, media_type="application/json")
 
-        # Load and embed PDF context
-        logger.info(f"Loading PDF context from {RESUME_PATH}...")
-        load_and_store_context(RESUME_PATH)
-        logger.info("PDF context loaded successfully.")
-
-        # Initialize Prometheus metrics
-        if ENABLE_METRICS and REQUEST_COUNT is None:
-            REQUEST_COUNT = Counter(
-                'request_count', 'App Request Count',
-                ['app_name', 'endpoint', 'method', 'status_code']
-            )
-            REQUEST_LATENCY = Histogram(
-                'request_latency_seconds', 'Request latency in seconds',
-                ['app_name', 'endpoint']
-            )
-            start_http_server(METRICS_PORT)
-            logger.info(f"Metrics server started on port {METRICS_PORT}")
+async def require_context(request: Request):
+    """
+    Reject questions while the PDF context is loading, so empty-context answers are not
+    served or cached. After a failed startup questions are answered without context (and
+    never cached, as no context version is set), as before.
+    """
+    if request.app.state.context_state == "loading":
+        raise HTTPException(
+            status_code=503, detail="Context is still loading", headers={"Retry-After": "5"}
+        )
 
-    except Exception as e:
-        logger.error(f"Error initializing services: {str(e)}")
-
-@app.get("/health", response_model=HealthResponse)
-async def health_check():
-    return {"status": "healthy", "version": "1.0.0"}
-
-@app.post("/ask")
-async def ask(
-    req: AskRequest,
-    rate_limiter: Optional[RateLimiter] = Depends(RateLimiter(times=RATE_LIMIT, seconds=RATE_LIMIT_PERIOD))
-):
+# Plain def: FastAPI runs it in the threadpool, so the blocking Gemini/DB calls
+# in handle_question no longer stall the event loop
+@app.post("/ask", dependencies=[Depends(require_context), Depends(rate_limiter)], response_model=AskResponse)
+def ask(req: AskRequest):
+    from app.ask import handle_question
     try:
         response = handle_question(req.question)
-        return {"response": response}
+        return AskResponse(response=response)
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
         raise HTTPException(status_code=500, detail="An error occurred while processing your request")
 
-@app.post("/ask/async")
-async def ask_async(
-    req: AskRequest,
-    rate_limiter: Optional[RateLimiter] = Depends(RateLimiter(times=RATE_LIMIT, seconds=RATE_LIMIT_PERIOD))
-):
+@app.post("/ask/async", dependencies=[Depends(require_context), Depends(rate_limiter)], response_model=AskResponse)
+async def ask_async(req: AskRequest, request: Request):
+    from app.ask import handle_question_async
     try:
-        response = await handle_question_async(req.question)
-        return {"response": response}
+        response = await handle_question_async(req.question, request.app.state.http_client)
+        return AskResponse(response=response)
     except Exception as e:
         logger.error(f"Error processing question asynchronously: {str(e)}")
         raise HTTPException(status_code=500, detail="An error occurred while processing your request")
 
+@app.post("/ask/stream", dependencies=[Depends(require_context), Depends(rate_limiter)])
+async def ask_stream(req: AskRequest, request: Request):
+    from app.ask import handle_question_stream
+    # Forward answer fragments as they arrive to cut time to first byte
+    return StreamingResponse(
+        handle_question_stream(req.question, request.app.state.http_client), media_type="text/plain"
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {str(exc)}")
@@ -0,0 +1,47 @@
+import time
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Request
+
+
+class InProcessLimiter:
+    """
+    Per-client token bucket kept in process memory.
+
+    Used as a FastAPI dependency in place of fastapi-limiter's RateLimiter, it avoids a
+    Redis round trip on every request. Clients are identified the way fastapi-limiter
+    does it (first X-Forwarded-For address, else the peer IP), and each client gets
+    ``times`` tokens per route, refilled evenly over ``seconds``. Buckets are only
+    touched from the event loop with no await between read and write, so no lock is
+    needed. Limits are per worker process, so this suits single-worker or sticky-routed
+    deployments.
+    """
+
+    def __init__(self, times, seconds, max_clients=10000):
+        self.capacity = float(times)
+        self.refill_rate = times / seconds
+        # Idle buckets refill completely within `seconds`, so they can safely expire
+        self._buckets = TTLCache(maxsize=max_clients, ttl=seconds)
+
+    @staticmethod
+    def identify(request: Request):
+        """Client identifier matching fastapi-limiter's default_identifier."""
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def __call__(self, request: Request):
+        key = (self.identify(request), request.scope["path"])
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.refill_rate)
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            retry_after = int((1 - tokens) / self.refill_rate) + 1
+            raise HTTPException(
+                status_code=429, detail="Too Many Requests", headers={"Retry-After": str(retry_after)}
+            )
+
+        self._buckets[key] = (tokens - 1, now)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by question-embedding cosine similarity.
+
+    Paraphrased questions ("What's your experience?" / "What is your experience?")
+    produce near-identical embeddings, so a lookup compares the query against every
+    cached question in one matrix-vector product and reuses the closest answer if it
+    is above the similarity threshold. Entries live in a fixed-size ring buffer and
+    expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize, dim, threshold=0.97, ttl=3600):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._embeddings = np.zeros((maxsize, dim), dtype=np.float32)
+        self._answers = [None] * maxsize
+        self._expires_at = np.zeros(maxsize)  # empty slots are always expired
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def get(self, embedding):
+        """Return the cached answer for the most similar question, or None on a miss."""
+        query = self._normalize(embedding)
+        with self._lock:
+            sims = self._embeddings @ query
+            sims[self._expires_at <= time.monotonic()] = -np.inf
+            idx = int(np.argmax(sims))
+            if sims[idx] >= self.threshold:
+                return self._answers[idx]
+        return None
+
+    def set(self, embedding, answer):
+        """Store an answer, overwriting the oldest entry once the buffer is full."""
+        with self._lock:
+            idx = self._next
+            self._embeddings[idx] = self._normalize(embedding)
+            self._answers[idx] = answer
+            self._expires_at[idx] = time.monotonic() + self.ttl
+            self._next = (idx + 1) % self.maxsize
+
+    def clear(self):
+        """Drop all cached entries."""
+        with self._lock:
+            self._answers = [None] * self.maxsize
+            self._expires_at[:] = 0
+            self._next = 0
@@ -0,0 +1,163 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+
+import app.ask
+from app.ask import (
+    _answer_key, _is_cacheable, _search_sqlite, handle_question, handle_question_stream, response_cache,
+    set_context_version
+)
+from app.db import EMBEDDING_DIM, ContextChunk, get_db, get_ro_conn, init_db, is_sqlite, quantize_embedding
+from app.gemini import GeminiError, ERROR_RESPONSE, UNPROCESSABLE_RESPONSE
+
+
+class TestAsk(unittest.TestCase):
+    def test_answer_key_normalizes_question(self):
+        """Test that questions differing only in case and whitespace share a cache key."""
+        # Arrange
+        set_context_version("abc123")
+
+        # Act
+        key = _answer_key("  What are your Skills? ")
+
+        # Assert
+        self.assertEqual(key, _answer_key("what are your skills?"))
+        self.assertTrue(key.startswith("vabc123:"))
+
+    def test_answer_key_differs_between_questions(self):
+        """Test that different questions get different cache keys."""
+        # Arrange
+        set_context_version("abc123")
+
+        # Act / Assert
+        self.assertNotEqual(_answer_key("What are your skills?"), _answer_key("Where do you work?"))
+
+    def test_nothing_is_cacheable_before_context_is_loaded(self):
+        """Test that answers are not cached until a context version has been set."""
+        # Arrange
+        app.ask._context_version = None
+
+        # Act
+        cacheable = _is_cacheable("What are your skills?")
+
+        # Assert
+        self.assertFalse(cacheable)
+
+    def test_time_sensitive_question_is_not_cacheable(self):
+        """Test that questions about the current date are never cached."""
+        # Arrange
+        set_context_version("abc123")
+
+        # Act / Assert
+        self.assertTrue(_is_cacheable("What are your skills?"))
+        self.assertFalse(_is_cacheable("What are you working on today?"))
+
+    @patch("app.ask.cache_set")
+    @patch("app.ask.cache_get", return_value=None)
+    @patch("app.ask.get_relevant_context", return_value="context")
+    @patch("app.ask.get_question_embedding", return_value=np.ones(EMBEDDING_DIM, dtype=np.float32))
+    @patch("app.ask.ask_gemini", side_effect=GeminiError(ERROR_RESPONSE))
+    def test_failed_answer_is_not_cached(self, ask_gemini, *_):
+        """Test that a Gemini failure is returned to the user but not cached."""
+        # Arrange
+        set_context_version("abc123")
+        question = "What databases have you used?"
+
+        # Act
+        result = handle_question(question)
+
+        # Assert
+        self.assertEqual(result, ERROR_RESPONSE)
+        self.assertNotIn(_answer_key(question), response_cache)
+
+    def _run_stream(self, question, gemini_stream):
+        """Drive handle_question_stream against a fake Gemini stream and collect its output."""
+        async def collect():
+            return [fragment async for fragment in handle_question_stream(question, client=None)]
+
+        with patch("app.ask.ask_gemini_stream", gemini_stream), \
+                patch("app.ask.cache_get_async", AsyncMock(return_value=None)), \
+                patch("app.ask.cache_set_async", AsyncMock()), \
+                patch("app.ask.get_relevant_context_async", AsyncMock(return_value="context")), \
+                patch("app.ask.get_question_embedding", return_value=np.ones(EMBEDDING_DIM, dtype=np.float32)):
+            return asyncio.run(collect())
+
+    def test_errored_stream_is_not_cached(self):
+        """Test that a stream failing mid-answer yields the apology and caches nothing."""
+        # Arrange
+        set_context_version("abc123")
+        question = "Which cloud platforms have you used?"
+
+        async def gemini_stream(*_):
+            yield "Partial"
+            raise GeminiError(ERROR_RESPONSE)
+
+        # Act
+        fragments = self._run_stream(question, gemini_stream)
+
+        # Assert
+        self.assertEqual(fragments, ["Partial", ERROR_RESPONSE])
+        self.assertNotIn(_answer_key(question), response_cache)
+
+    def test_empty_stream_is_not_cached(self):
+        """Test that a stream with no text yields the fallback reply and caches nothing."""
+        # Arrange
+        set_context_version("abc123")
+        question = "What certifications do you hold?"
+
+        async def gemini_stream(*_):
+            raise GeminiError(UNPROCESSABLE_RESPONSE)
+            yield  # pragma: no cover - makes this an async generator
+
+        # Act
+        fragments = self._run_stream(question, gemini_stream)
+
+        # Assert
+        self.assertEqual(fragments, [UNPROCESSABLE_RESPONSE])
+        self.assertNotIn(_answer_key(question), response_cache)
+
+
+@unittest.skipUnless(is_sqlite, "uses the SQLite test database")
+class TestSearchSqlite(unittest.TestCase):
+    def setUp(self):
+        init_db()
+        with get_db() as db:
+            db.query(ContextChunk).delete()
+
+    def store(self, rows):
+        with get_db() as db:
+            db.bulk_insert_mappings(ContextChunk, [
+                {"source": "resume.pdf", "content": content, "embedding": blob} for content, blob in rows
+            ])
+
+    def test_returns_nearest_chunks_in_order(self):
+        """Test that the closest stored embeddings are returned nearest first."""
+        # Arrange
+        basis = np.eye(EMBEDDING_DIM, dtype=np.float32)
+        self.store([(f"chunk {i}", quantize_embedding(basis[i]).tobytes()) for i in range(3)])
+        query = basis[2] * 0.8 + basis[0] * 0.6
+
+        # Act
+        with get_ro_conn() as conn:
+            results = _search_sqlite(conn, query, top_k=2)
+
+        # Assert
+        self.assertEqual(results, [("chunk 2",), ("chunk 0",)])
+
+    def test_mismatched_blobs_return_no_context(self):
+        """Test that blobs stored with another dtype are rejected instead of raising."""
+        # Arrange
+        self.store([("chunk 0", np.zeros(EMBEDDING_DIM + 1, dtype=np.float32).tobytes())])
+
+        # Act
+        with get_ro_conn() as conn:
+            results = _search_sqlite(conn, np.ones(EMBEDDING_DIM, dtype=np.float32), top_k=1)
+
+        # Assert
+        self.assertEqual(results, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,22 @@
+import os
+import tempfile
 import unittest
-from app.context_loader import chunk_text
+from unittest.mock import patch
+
+import numpy as np
+
+from app.context_loader import chunk_text, load_and_store_context
+from app.db import EMBEDDING_DIM, ContextChunk, Document, get_db, init_db, is_sqlite
+
+
+def fake_embeddings(chunks):
+    """Deterministic unit vectors, so loads can be tested without running the model."""
+    return [np.eye(EMBEDDING_DIM, dtype=np.float32)[i % EMBEDDING_DIM] for i in range(len(chunks))]
+
+
+def read_text(file_path):
+    with open(file_path) as f:
+        return f.read()
 
 
 class TestContextLoader(unittest.TestCase):
@@ -43,6 +60,122 @@ class TestContextLoader(unittest.TestCase):
             curr_chunk_words = chunks[i].split()[:overlap]
             self.assertEqual(prev_chunk_words, curr_chunk_words)
 
+    def test_chunk_text_slices_original_text(self):
+        """Test that chunks are slices of the input, preserving its inner whitespace."""
+        # Arrange
+        words = ["word" + str(i) for i in range(10)]
+        text = "  " + "\n".join(words) + "\n"
+        chunk_size = 4
+        overlap = 1
+
+        # Act
+        chunks = chunk_text(text, chunk_size, overlap)
+
+        # Assert
+        self.assertEqual(chunks[0], "\n".join(words[0:4]))
+        self.assertEqual(chunks[-1], "\n".join(words[6:10]))
+        for chunk in chunks:
+            self.assertIn(chunk, text)
+
+
+@unittest.skipUnless(is_sqlite, "uses the SQLite test database")
+@patch("app.context_loader.extract_text_from_pdf", side_effect=read_text)
+class TestLoadAndStoreContext(unittest.TestCase):
+    def setUp(self):
+        init_db()
+        with get_db() as db:
+            db.query(ContextChunk).delete()
+            db.query(Document).delete()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "resume.pdf")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_resume(self, content):
+        with open(self.path, "w") as f:
+            f.write(content)
+
+    def stored(self):
+        with get_db() as db:
+            contents = [row.content for row in db.query(ContextChunk).all()]
+            document = db.get(Document, "resume.pdf")
+            return contents, document.file_hash if document else None
+
+    @patch("app.context_loader.get_embeddings", side_effect=fake_embeddings)
+    def test_unchanged_file_is_skipped(self, get_embeddings, _):
+        """Test that loading the same file twice embeds and stores it only once."""
+        # Arrange
+        self.write_resume("Python developer with FastAPI experience")
+        first_hash = load_and_store_context(self.path)
+
+        # Act
+        second_hash = load_and_store_context(self.path)
+
+        # Assert
+        self.assertEqual(first_hash, second_hash)
+        self.assertEqual(get_embeddings.call_count, 1)
+        contents, file_hash = self.stored()
+        self.assertEqual(contents, ["Python developer with FastAPI experience"])
+        self.assertEqual(file_hash, first_hash)
+
+    @patch("app.context_loader.get_embeddings", side_effect=fake_embeddings)
+    def test_changed_file_replaces_chunks(self, *_):
+        """Test that a changed file replaces the stored chunks and document hash."""
+        # Arrange
+        self.write_resume("Python developer with FastAPI experience")
+        load_and_store_context(self.path)
+        self.write_resume("Go developer with Kubernetes experience")
+
+        # Act
+        new_hash = load_and_store_context(self.path)
+
+        # Assert
+        contents, file_hash = self.stored()
+        self.assertEqual(contents, ["Go developer with Kubernetes experience"])
+        self.assertEqual(file_hash, new_hash)
+
+    @patch("app.context_loader.get_embeddings", side_effect=fake_embeddings)
+    def test_changed_embedding_format_reloads(self, get_embeddings, _):
+        """Test that an unchanged file is re-embedded when the model or storage dtype changed."""
+        # Arrange
+        self.write_resume("Python developer with FastAPI experience")
+        load_and_store_context(self.path)
+
+        # Act
+        with patch("app.context_loader.EMBEDDING_FORMAT", "other-model:int8"):
+            load_and_store_context(self.path)
+
+        # Assert
+        self.assertEqual(get_embeddings.call_count, 2)
+        contents, _ = self.stored()
+        self.assertEqual(contents, ["Python developer with FastAPI experience"])
+        with get_db() as db:
+            self.assertEqual(db.get(Document, "resume.pdf").embedding_format, "other-model:int8")
+
+    def test_interrupted_load_keeps_previous_context(self, _):
+        """Test that a failed reload leaves the previous chunks and hash intact."""
+        # Arrange
+        self.write_resume("Python developer with FastAPI experience")
+        with patch("app.context_loader.get_embeddings", side_effect=fake_embeddings):
+            original_hash = load_and_store_context(self.path)
+        self.write_resume("Go developer with Kubernetes experience")
+        with patch("app.context_loader.get_embeddings", side_effect=RuntimeError("interrupted")):
+            with self.assertRaises(RuntimeError):
+                load_and_store_context(self.path)
+
+        # Act: the file reverts, so the stored context is still current
+        self.write_resume("Python developer with FastAPI experience")
+        with patch("app.context_loader.get_embeddings", side_effect=fake_embeddings) as get_embeddings:
+            reverted_hash = load_and_store_context(self.path)
+
+        # Assert
+        self.assertEqual(reverted_hash, original_hash)
+        get_embeddings.assert_not_called()
+        contents, file_hash = self.stored()
+        self.assertEqual(contents, ["Python developer with FastAPI experience"])
+        self.assertEqual(file_hash, original_hash)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from app.db import EMBEDDING_BLOB_DTYPE, EMBEDDING_DIM, quantize_embedding
+
+
+def unit_vector(seed):
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestQuantizeEmbedding(unittest.TestCase):
+    def test_uses_configured_dtype(self):
+        """Test that embeddings are converted to the configured SQLite storage dtype."""
+        # Arrange
+        embedding = unit_vector(0)
+
+        # Act
+        quantized = quantize_embedding(embedding)
+
+        # Assert
+        self.assertEqual(quantized.dtype, EMBEDDING_BLOB_DTYPE)
+        self.assertEqual(quantized.shape, (EMBEDDING_DIM,))
+
+    @patch("app.db.EMBEDDING_BLOB_DTYPE", np.int8)
+    def test_int8_scales_unit_vectors(self):
+        """Test that int8 storage maps [-1, 1] onto [-127, 127] and preserves direction."""
+        # Arrange
+        embedding = unit_vector(1)
+
+        # Act
+        quantized = quantize_embedding(embedding)
+
+        # Assert
+        self.assertEqual(quantized.dtype, np.int8)
+        self.assertLessEqual(np.abs(quantized).max(), 127)
+        restored = quantized.astype(np.float32) / 127
+        cosine = restored @ embedding / np.linalg.norm(restored)
+        self.assertGreater(cosine, 0.99)
+
+    @patch("app.db.EMBEDDING_BLOB_DTYPE", np.int8)
+    def test_int8_clips_out_of_range_values(self):
+        """Test that components outside [-1, 1] are clipped instead of wrapping around."""
+        # Arrange
+        embedding = np.full(EMBEDDING_DIM, 2.0, dtype=np.float32)
+
+        # Act
+        quantized = quantize_embedding(embedding)
+
+        # Assert
+        self.assertTrue((quantized == 127).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
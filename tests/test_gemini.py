@@ -1,5 +1,24 @@
+import asyncio
 import unittest
-from app.gemini import create_prompt
+
+import httpx
+
+from app.gemini import (
+    GeminiError, ERROR_RESPONSE, UNEXPECTED_ERROR_RESPONSE, UNPROCESSABLE_RESPONSE,
+    ask_gemini_async, ask_gemini_stream, create_prompt
+)
+
+
+def make_client(status_code, json_body=None, content=None):
+    """AsyncClient whose requests are answered locally with a fixed response."""
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(status_code, json=json_body, content=content)
+    )
+    return httpx.AsyncClient(transport=transport)
+
+
+async def collect_stream(client):
+    return [fragment async for fragment in ask_gemini_stream("What are my skills?", "context", client)]
 
 
 class TestGemini(unittest.TestCase):
@@ -18,6 +37,82 @@ class TestGemini(unittest.TestCase):
         self.assertIn("Given the context information and not prior knowledge", prompt)
         self.assertIn("If the answer cannot be found in the context", prompt)
 
+    def test_ask_gemini_async_raises_on_http_error(self):
+        """Test that an HTTP error raises GeminiError carrying the user-facing reply."""
+        # Arrange
+        client = make_client(500, {"error": "boom"})
+
+        # Act
+        with self.assertRaises(GeminiError) as ctx:
+            asyncio.run(ask_gemini_async("What are my skills?", "context", client))
+
+        # Assert
+        self.assertEqual(ctx.exception.response, ERROR_RESPONSE)
+
+    def test_ask_gemini_async_returns_answer_text(self):
+        """Test that a well-formed response returns the answer text."""
+        # Arrange
+        body = {"candidates": [{"content": {"parts": [{"text": "Python and Docker."}]}}]}
+        client = make_client(200, body)
+
+        # Act
+        result = asyncio.run(ask_gemini_async("What are my skills?", "context", client))
+
+        # Assert
+        self.assertEqual(result, "Python and Docker.")
+
+    def test_ask_gemini_stream_yields_fragments(self):
+        """Test that SSE data lines are yielded as answer fragments."""
+        # Arrange
+        content = (
+            b'data: {"candidates": [{"content": {"parts": [{"text": "Python"}]}}]}\n\n'
+            b'data: {"candidates": [{"content": {"parts": [{"text": " and Docker."}]}}]}\n\n'
+        )
+        client = make_client(200, content=content)
+
+        # Act
+        fragments = asyncio.run(collect_stream(client))
+
+        # Assert
+        self.assertEqual(fragments, ["Python", " and Docker."])
+
+    def test_ask_gemini_stream_raises_on_empty_stream(self):
+        """Test that a stream without any text (e.g. a safety block) raises GeminiError."""
+        # Arrange
+        content = b'data: {"candidates": [{"finishReason": "SAFETY"}]}\n\n'
+        client = make_client(200, content=content)
+
+        # Act
+        with self.assertRaises(GeminiError) as ctx:
+            asyncio.run(collect_stream(client))
+
+        # Assert
+        self.assertEqual(ctx.exception.response, UNPROCESSABLE_RESPONSE)
+
+    def test_ask_gemini_stream_raises_on_malformed_event(self):
+        """Test that an invalid JSON event raises GeminiError instead of a bare ValueError."""
+        # Arrange
+        client = make_client(200, content=b"data: {not json\n\n")
+
+        # Act
+        with self.assertRaises(GeminiError) as ctx:
+            asyncio.run(collect_stream(client))
+
+        # Assert
+        self.assertEqual(ctx.exception.response, UNEXPECTED_ERROR_RESPONSE)
+
+    def test_ask_gemini_stream_raises_on_http_error(self):
+        """Test that an HTTP error raises GeminiError."""
+        # Arrange
+        client = make_client(503, {"error": "unavailable"})
+
+        # Act
+        with self.assertRaises(GeminiError) as ctx:
+            asyncio.run(collect_stream(client))
+
+        # Assert
+        self.assertEqual(ctx.exception.response, ERROR_RESPONSE)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from app.rate_limit import InProcessLimiter
+
+
+def make_request(host, path="/ask", forwarded_for=None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+    return SimpleNamespace(client=SimpleNamespace(host=host), headers=headers, scope={"path": path})
+
+
+class TestInProcessLimiter(unittest.TestCase):
+    def test_allows_requests_within_limit(self):
+        """Test that a client can make up to `times` requests without being limited."""
+        # Arrange
+        limiter = InProcessLimiter(times=3, seconds=60)
+
+        # Act / Assert
+        for _ in range(3):
+            asyncio.run(limiter(make_request("1.2.3.4")))
+
+    def test_rejects_requests_over_limit(self):
+        """Test that exceeding the limit raises a 429 with a Retry-After header."""
+        # Arrange
+        limiter = InProcessLimiter(times=2, seconds=60)
+        request = make_request("1.2.3.4")
+        asyncio.run(limiter(request))
+        asyncio.run(limiter(request))
+
+        # Act
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(limiter(request))
+
+        # Assert
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertIn("Retry-After", ctx.exception.headers)
+
+    def test_limits_are_per_client(self):
+        """Test that one client exhausting its bucket does not limit another."""
+        # Arrange
+        limiter = InProcessLimiter(times=1, seconds=60)
+        asyncio.run(limiter(make_request("1.2.3.4")))
+
+        # Act / Assert
+        asyncio.run(limiter(make_request("5.6.7.8")))
+
+    def test_limits_are_per_route(self):
+        """Test that exhausting one route's bucket does not limit another route."""
+        # Arrange
+        limiter = InProcessLimiter(times=1, seconds=60)
+        asyncio.run(limiter(make_request("1.2.3.4", path="/ask")))
+
+        # Act / Assert
+        asyncio.run(limiter(make_request("1.2.3.4", path="/ask/async")))
+
+    def test_forwarded_clients_are_limited_separately(self):
+        """Test that clients behind the same proxy are keyed by X-Forwarded-For."""
+        # Arrange
+        limiter = InProcessLimiter(times=1, seconds=60)
+        asyncio.run(limiter(make_request("10.0.0.1", forwarded_for="1.2.3.4, 10.0.0.1")))
+
+        # Act / Assert
+        asyncio.run(limiter(make_request("10.0.0.1", forwarded_for="5.6.7.8, 10.0.0.1")))
+        with self.assertRaises(HTTPException):
+            asyncio.run(limiter(make_request("10.0.0.1", forwarded_for="1.2.3.4")))
+
+    @patch("app.rate_limit.time.monotonic")
+    def test_tokens_refill_over_time(self, monotonic):
+        """Test that a limited client is allowed again once a token has refilled."""
+        # Arrange
+        limiter = InProcessLimiter(times=2, seconds=60)
+        request = make_request("1.2.3.4")
+        monotonic.return_value = 1000.0
+        asyncio.run(limiter(request))
+        asyncio.run(limiter(request))
+        with self.assertRaises(HTTPException):
+            asyncio.run(limiter(request))
+
+        # Act
+        monotonic.return_value = 1030.0  # one token refills every 30 seconds
+
+        # Assert
+        asyncio.run(limiter(request))
+        with self.assertRaises(HTTPException):
+            asyncio.run(limiter(request))
+
+
+if __name__ == "__main__":
+    unittest.main()
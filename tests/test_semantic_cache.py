@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from app.semantic_cache import SemanticCache
+
+
+class TestSemanticCache(unittest.TestCase):
+    def test_similar_question_hits(self):
+        """Test that a near-identical embedding returns the cached answer."""
+        # Arrange
+        cache = SemanticCache(maxsize=4, dim=3, threshold=0.97)
+        cache.set(np.array([1.0, 0.0, 0.0]), "answer")
+
+        # Act
+        result = cache.get(np.array([2.0, 0.05, 0.0]))
+
+        # Assert
+        self.assertEqual(result, "answer")
+
+    def test_dissimilar_question_misses(self):
+        """Test that an embedding below the threshold is a cache miss."""
+        # Arrange
+        cache = SemanticCache(maxsize=4, dim=3, threshold=0.97)
+        cache.set(np.array([1.0, 0.0, 0.0]), "answer")
+
+        # Act
+        result = cache.get(np.array([0.0, 1.0, 0.0]))
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_oldest_entry_is_evicted(self):
+        """Test that the ring buffer overwrites the oldest entry when full."""
+        # Arrange
+        cache = SemanticCache(maxsize=2, dim=3)
+        cache.set(np.array([1.0, 0.0, 0.0]), "first")
+        cache.set(np.array([0.0, 1.0, 0.0]), "second")
+        cache.set(np.array([0.0, 0.0, 1.0]), "third")
+
+        # Act / Assert
+        self.assertIsNone(cache.get(np.array([1.0, 0.0, 0.0])))
+        self.assertEqual(cache.get(np.array([0.0, 1.0, 0.0])), "second")
+        self.assertEqual(cache.get(np.array([0.0, 0.0, 1.0])), "third")
+
+    def test_expired_entry_misses(self):
+        """Test that entries older than the TTL are ignored."""
+        # Arrange
+        cache = SemanticCache(maxsize=2, dim=3, ttl=0)
+        cache.set(np.array([1.0, 0.0, 0.0]), "answer")
+
+        # Act
+        result = cache.get(np.array([1.0, 0.0, 0.0]))
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_clear_drops_entries(self):
+        """Test that clear() empties the cache."""
+        # Arrange
+        cache = SemanticCache(maxsize=2, dim=3)
+        cache.set(np.array([1.0, 0.0, 0.0]), "answer")
+
+        # Act
+        cache.clear()
+
+        # Assert
+        self.assertIsNone(cache.get(np.array([1.0, 0.0, 0.0])))
+
+
+if __name__ == "__main__":
+    unittest.main()